@@ -1,6 +1,34 @@
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import codecs
+import contextlib
 import os
-import glob
+import re
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pandas.api.types import is_datetime64_any_dtype, union_categoricals
+
+COLUMNS_ORDER = [
+    'SEANCE', 'CODE_INDICE', 'LIB_INDICE',
+    'INDICE_JOUR', 'INDICE_VEILLE', 'VARIATION_VEILLE',
+    'INDICE_PLUS_HAUT', 'INDICE_PLUS_BAS', 'INDICE_OUV',
+    'SOURCE_FILE', 'SOURCE_FOLDER'
+]
+
+# Text columns with a small, repeated vocabulary
+CATEGORICAL_COLUMNS = ['CODE_INDICE', 'LIB_INDICE', 'SOURCE_FILE', 'SOURCE_FOLDER']
+
+# Cleaned frames are cached next to their source file. Bump CACHE_VERSION
+# whenever the cleaning logic changes so existing caches are treated as misses
+CACHE_VERSION = 2
+CACHE_SUFFIX = f'.cache-v{CACHE_VERSION}.parquet'
+
+READ_KW = dict(
+    engine='pyarrow',
+    na_values=['', ' ', 'N/A'],
+    skip_blank_lines=True,
+)
 
 
 def clean_column_names(df):
@@ -9,15 +37,60 @@ def clean_column_names(df):
     return df
 
 
+def drop_separator_rows(df):
+    """Drop the dashed separator rows under the header, detected on the first column"""
+    first_column = df.iloc[:, 0]
+    if first_column.dtype != object:
+        return df
+    return df[~first_column.str.fullmatch(r'\s*-{2,}\s*', na=False)]
+
+
+def read_sample(file_path, sample_size=65536):
+    """Read the first bytes of a file for format sniffing"""
+    with open(file_path, 'rb') as f:
+        return f.read(sample_size)
+
+
+def detect_encoding(sample):
+    """Guess a file's encoding from its first bytes"""
+    if sample.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+
+    try:
+        # Incremental decode tolerates a multi-byte character cut at the end
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        # latin-1 maps every byte, so the read itself can no longer fail
+        return 'latin-1'
+
+
+def detect_decimal(sample):
+    """Guess the decimal separator from quoted comma numbers in the sample"""
+    if re.search(rb'"-?\d*,\d+"', sample):
+        return ','
+    return '.'
+
+
 def standardize_date_format(df):
-    """Convert date column to standard datetime format, handling multiple formats"""
+    """Convert DD/MM/YYYY date column to standard datetime format"""
     if 'SEANCE' in df.columns:
-        df['SEANCE'] = pd.to_datetime(
-            df['SEANCE'].astype(str).str.strip(),
-            errors='coerce',
-            dayfirst=True,  # handles DD/MM/YYYY
-            infer_datetime_format=True
+        if is_datetime64_any_dtype(df['SEANCE']):
+            return df
+
+        # Each date repeats once per index code, so parse only the distinct values
+        seance = df['SEANCE'].astype(str).str.strip()
+        unique_dates = seance.unique()
+        parsed_dates = pd.Series(
+            pd.to_datetime(
+                unique_dates,
+                format='%d/%m/%Y',
+                errors='coerce',
+                cache=True
+            ),
+            index=unique_dates
         )
+        df['SEANCE'] = seance.map(parsed_dates)
     return df
 
 
@@ -28,54 +101,103 @@ def clean_numeric_columns(df):
 
     for col in numeric_columns:
         if col in df.columns:
-            df[col] = pd.to_numeric(
-                df[col].astype(str).str.replace(',', '.').str.strip(),
-                errors='coerce'
-            )
+            # read_csv already parses most columns; only text ones need cleanup
+            if df[col].dtype == object:
+                df[col] = pd.to_numeric(
+                    df[col].str.replace(',', '.', regex=False).str.strip(),
+                    errors='coerce'
+                )
+            df[col] = df[col].astype('float32')
         else:
-            df[col] = pd.NA
+            df[col] = pd.Series(index=df.index, dtype='float32')
 
     return df
 
 
-def process_csv_file(file_path):
-    """Process a single CSV file"""
-    try:
-        # Try multiple encodings
-        encodings = ['utf-8', 'latin-1', 'cp1252', 'iso-8859-1']
-        df = None
-        for enc in encodings:
-            try:
-                df = pd.read_csv(file_path)
-                break
-            except UnicodeDecodeError:
-                continue
+def to_categoricals(df):
+    """Convert code, label and source columns to categories"""
+    # Codes may come back as text or float; store them as nullable integers,
+    # with unparseable codes as NA rather than failing the whole file
+    if 'CODE_INDICE' in df.columns:
+        df['CODE_INDICE'] = pd.to_numeric(df['CODE_INDICE'], errors='coerce').astype('Int64')
 
-        if df is None:
-            print(f"Could not read {file_path}")
-            return None
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
 
-        # Clean column names
-        df = clean_column_names(df)
+    return df
+
+
+def clean_csv_file(file_path):
+    """Read a single CSV file and clean it into the combined layout"""
+    sample = read_sample(file_path)
+    df = pd.read_csv(
+        file_path,
+        encoding=detect_encoding(sample),
+        decimal=detect_decimal(sample),
+        **READ_KW
+    )
+
+    df = drop_separator_rows(df)
 
-        # Strip whitespace from string columns
-        df = df.apply(lambda x: x.str.strip() if x.dtype == "object" else x)
+    # Clean column names and keep only the known columns
+    df = clean_column_names(df)
+    df = df[[col for col in df.columns if col in COLUMNS_ORDER]]
 
-        # Remove separator rows
-        df = df[~df.iloc[:, 0].astype(str).str.contains('---', na=False)]
+    # Strip whitespace from string columns
+    for col in df.select_dtypes(include='object').columns:
+        df[col] = df[col].str.strip()
 
-        # Drop empty rows
-        df = df.dropna(how='all')
+    # Standardize date column
+    df = standardize_date_format(df)
 
-        # Standardize date column
-        df = standardize_date_format(df)
+    # Clean numeric columns
+    df = clean_numeric_columns(df)
 
-        # Clean numeric columns
-        df = clean_numeric_columns(df)
+    # Add source info
+    df['SOURCE_FILE'] = os.path.basename(file_path)
+    df['SOURCE_FOLDER'] = os.path.basename(os.path.dirname(file_path))
+
+    # Store repeated labels as categories
+    df = to_categoricals(df)
+
+    return df
 
-        # Add source info
-        df['SOURCE_FILE'] = os.path.basename(file_path)
-        df['SOURCE_FOLDER'] = os.path.basename(os.path.dirname(file_path))
+
+def write_cache(df, cache_file):
+    """Write a cleaned frame to its cache via a temp file, so an interrupted write leaves no partial cache"""
+    tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+    try:
+        df.to_parquet(tmp_file, compression='zstd', index=False)
+        os.replace(tmp_file, cache_file)
+    except (OSError, pa.ArrowException) as e:
+        print(f"Could not write cache {cache_file}: {str(e)}")
+        with contextlib.suppress(OSError):
+            os.remove(tmp_file)
+
+
+def process_csv_file(file_path, keep_indices=None):
+    """Process a single CSV file, optionally keeping only some LIB_INDICE values"""
+    try:
+        # Reuse the cleaned frame of a previous run if the source is unchanged
+        cache_file = file_path + CACHE_SUFFIX
+        df = None
+        if os.path.exists(cache_file) and os.path.getmtime(cache_file) > os.path.getmtime(file_path):
+            try:
+                df = to_categoricals(pd.read_parquet(cache_file))
+            except (OSError, pa.ArrowException) as e:
+                print(f"Ignoring unreadable cache for {file_path}: {str(e)}")
+
+        if df is None:
+            df = clean_csv_file(file_path)
+            write_cache(df, cache_file)
+
+        # The cache holds every index, so filtering happens afterwards
+        if keep_indices is not None:
+            if 'LIB_INDICE' in df.columns:
+                df = df[df['LIB_INDICE'].isin(keep_indices)]
+            else:
+                df = df.iloc[0:0]
 
         return df
 
@@ -84,67 +206,119 @@ def process_csv_file(file_path):
         return None
 
 
-def combine_csv_files(base_path='.', start_year=2008, end_year=2024, output_file='combined_indices.csv'):
+def scan_csv_files(base_path, start_year, end_year):
+    """Map each year with an indice_<year> folder to the CSV files it contains"""
+    csv_files_by_year = {}
+    with os.scandir(base_path) as folders:
+        for folder in folders:
+            year = folder.name[len('indice_'):]
+            if not folder.name.startswith('indice_') or not year.isdigit() or not folder.is_dir():
+                continue
+            if not start_year <= int(year) <= end_year:
+                continue
+
+            with os.scandir(folder.path) as files:
+                csv_files_by_year[int(year)] = sorted(
+                    entry.path for entry in files
+                    if entry.name.endswith('.csv') and entry.is_file()
+                )
+
+    return csv_files_by_year
+
+
+def unify_categories(dataframes):
+    """Give categorical columns the same categories in every frame so concat keeps them categorical"""
+    for col in CATEGORICAL_COLUMNS:
+        present = [df[col] for df in dataframes if col in df.columns]
+        if not present:
+            continue
+
+        categories = union_categoricals(present, sort_categories=True).categories
+        for df in dataframes:
+            if col in df.columns:
+                df[col] = df[col].cat.set_categories(categories)
+            else:
+                df[col] = pd.Categorical.from_codes([-1] * len(df), categories=categories)
+
+    return dataframes
+
+
+def write_csv(df, output_file):
+    """Write a combined frame to UTF-8 CSV with pyarrow's multi-threaded writer"""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+
+    # Render dates without a time part and categoricals as their values
+    columns = []
+    for field, column in zip(table.schema, table.columns):
+        if pa.types.is_timestamp(field.type):
+            column = column.cast(pa.date32())
+        elif pa.types.is_dictionary(field.type):
+            column = column.cast(field.type.value_type)
+        columns.append(column)
+
+    table = pa.Table.from_arrays(columns, names=table.column_names)
+
+    # The header is written unquoted as to_csv did; pyarrow still quotes
+    # string values and prints integral floats without a trailing '.0'
+    with open(output_file, 'wb') as f:
+        f.write((','.join(table.column_names) + '\n').encode('utf-8'))
+        pacsv.write_csv(table, f, pacsv.WriteOptions(include_header=False))
+
+
+def combine_csv_files(base_path='.', start_year=2008, end_year=2024, output_file='combined_indices.csv',
+                      keep_indices=None):
     """Combine CSV files across multiple yearly folders"""
-    all_dataframes = []
+    csv_files_by_year = scan_csv_files(base_path, start_year, end_year)
+    all_csv_files = []
 
     for year in range(start_year, end_year + 1):
         folder_name = f"indice_{year}"
-        folder_path = os.path.join(base_path, folder_name)
 
-        if not os.path.exists(folder_path):
+        if year not in csv_files_by_year:
             print(f"Folder {folder_name} not found, skipping...")
             continue
 
-        print(f"Processing folder: {folder_name}")
-
-        csv_files = glob.glob(os.path.join(folder_path, "*.csv"))
-        if not csv_files:
+        if not csv_files_by_year[year]:
             print(f"No CSV files found in {folder_name}")
             continue
 
-        folder_dataframes = []
-        for csv_file in csv_files:
-            print(f"  Processing: {os.path.basename(csv_file)}")
-            df = process_csv_file(csv_file)
-            if df is not None and not df.empty:
-                folder_dataframes.append(df)
+        all_csv_files.extend(csv_files_by_year[year])
 
-        if folder_dataframes:
-            folder_combined = pd.concat(folder_dataframes, ignore_index=True)
-            all_dataframes.append(folder_combined)
-            print(f"  Combined {len(folder_dataframes)} files from {folder_name}")
+    # Files are independent, so parse them on all cores
+    print(f"Processing {len(all_csv_files)} files...")
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        process = partial(process_csv_file, keep_indices=keep_indices)
+        results = executor.map(process, all_csv_files, chunksize=4)
+        all_dataframes = [df for df in results if df is not None and not df.empty]
 
     if not all_dataframes:
         print("No data found to combine!")
         return None
 
-    # Combine all years
-    combined_df = pd.concat(all_dataframes, ignore_index=True)
+    # Combine all files from all years in a single pass
+    all_dataframes = unify_categories(all_dataframes)
+    combined_df = pd.concat(all_dataframes, ignore_index=True, copy=False, sort=False)
 
     # Ensure consistent column order
-    columns_order = [
-        'SEANCE', 'CODE_INDICE', 'LIB_INDICE',
-        'INDICE_JOUR', 'INDICE_VEILLE', 'VARIATION_VEILLE',
-        'INDICE_PLUS_HAUT', 'INDICE_PLUS_BAS', 'INDICE_OUV',
-        'SOURCE_FILE', 'SOURCE_FOLDER'
-    ]
-    for col in columns_order:
+    for col in COLUMNS_ORDER:
         if col not in combined_df.columns:
             combined_df[col] = pd.NA
 
-    combined_df = combined_df[columns_order]
+    combined_df = combined_df[COLUMNS_ORDER]
 
-    # Remove every entry with a null value in 'SEANCE' column BEFORE saving
+    # Remove every entry with a null value in 'SEANCE' column BEFORE saving;
+    # this also drops separator and blank rows, which are read as all-NaN
     combined_df = combined_df.dropna(subset=['SEANCE'])
 
     # Sort by date and code
     combined_df = combined_df.sort_values(['SEANCE', 'CODE_INDICE']).reset_index(drop=True)
 
-    # Save to CSV
-    combined_df.to_csv(output_file, index=False, encoding='utf-8')
+    # Save to Parquet for downstream steps, and to CSV for compatibility
+    parquet_file = os.path.splitext(output_file)[0] + '.parquet'
+    combined_df.to_parquet(parquet_file, engine='pyarrow', compression='zstd', index=False)
+    write_csv(combined_df, output_file)
 
-    print(f"\nCombined dataset saved as: {output_file}")
+    print(f"\nCombined dataset saved as: {parquet_file} and {output_file}")
     print(f"Total records: {len(combined_df)}")
     print(f"Date range: {combined_df['SEANCE'].min()} to {combined_df['SEANCE'].max()}")
     print(f"Unique indices: {combined_df['CODE_INDICE'].nunique()}")
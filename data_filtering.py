@@ -1,16 +1,25 @@
+import os
 import pandas as pd
+import pyarrow.parquet as pq
 
-# Read the CSV file
-df = pd.read_csv('combined_tunisian_indices.csv')
+PARQUET_FILE = 'combined_tunisian_indices.parquet'
+CSV_FILE = 'combined_tunisian_indices.csv'
 
-# Filter rows where LIB_INDICE equals 'TUNINDEX'
-filtered_df = df[df['LIB_INDICE'] == 'TUNINDEX']
+if os.path.exists(PARQUET_FILE):
+    # Read only the TUNINDEX rows; the filter is pushed down into the Parquet reader
+    filtered_df = pd.read_parquet(PARQUET_FILE, filters=[('LIB_INDICE', '==', 'TUNINDEX')])
+    original_rows = pq.ParquetFile(PARQUET_FILE).metadata.num_rows
+else:
+    # Fall back to the tracked CSV until data_combining.py has written the Parquet file
+    df = pd.read_csv(CSV_FILE)
+    filtered_df = df[df['LIB_INDICE'] == 'TUNINDEX']
+    original_rows = len(df)
 
 # Save the filtered data to a new CSV file
 filtered_df.to_csv('tunindex_filtered.csv', index=False)
 
 print(f"Filtered data saved to 'tunindex_filtered.csv'")
-print(f"Original data: {len(df)} rows")
+print(f"Original data: {original_rows} rows")
 print(f"Filtered data: {len(filtered_df)} rows")
 
 # Display the first few rows of filtered data
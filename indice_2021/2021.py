@@ -1,5 +1,16 @@
 import pandas as pd
-from data_combining import standardize_date_format
+from datetime import datetime
+from functools import lru_cache
+
+
+# Each date repeats once per index, so parse every distinct string only once
+@lru_cache(maxsize=4096)
+def parse_seance(value):
+    try:
+        return pd.Timestamp(datetime.strptime(value.strip(), '%d/%m/%Y'))
+    except ValueError:
+        return pd.NaT
+
 
 # Define corrected column specifications (start, end positions)
 colspecs = [
@@ -15,7 +26,7 @@ colspecs = [
 ]
 
 # Read the fixed-width file
-df = pd.read_fwf('histo_indice_2021.txt', colspecs=colspecs, skiprows=2, engine='python')
+df = pd.read_fwf('histo_indice_2021.txt', colspecs=colspecs, skiprows=2)
 
 # Add column names
 df.columns = [
@@ -31,7 +42,7 @@ df.columns = [
 ]
 
 # Standardize the date format
-df = standardize_date_format(df)
+df['SEANCE'] = pd.to_datetime(df['SEANCE'].astype(str).map(parse_seance))
 
 # Clean numeric columns
 numeric_columns = [
@@ -40,9 +51,9 @@ numeric_columns = [
 ]
 
 for col in numeric_columns:
-    if col in df.columns:
+    if col in df.columns and df[col].dtype == object:
         # Remove spaces, replace commas with dots if present, and convert to float
-        df[col] = pd.to_numeric(df[col].astype(str).str.replace(',', '.').str.strip(), errors='coerce')
+        df[col] = pd.to_numeric(df[col].str.replace(',', '.', regex=False).str.strip(), errors='coerce')
 
 # Save to CSV
 df.to_csv('histo_indice_2021.csv', index=False, encoding='utf-8')